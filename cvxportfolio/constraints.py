@@ -120,19 +120,22 @@ class ParticipationRateLimit(BaseTradeConstraint):
     """
 
     def __init__(self, volumes, max_fraction_of_volumes=0.05):
-        self.volumes = DataEstimator(volumes, compile_parameter=True)
+        self.volumes = DataEstimator(volumes)
         self.max_participation_rate = DataEstimator(
-            max_fraction_of_volumes, compile_parameter=True)
-        self.portfolio_value = cp.Parameter(nonneg=True)
+            max_fraction_of_volumes)
+
+    def _pre_evaluation(self, universe, backtest_times):
+        """The right-hand side is a single parameter, so the constraint is DPP."""
+        self.max_trades = cp.Parameter(len(universe)-1, nonneg=True)
 
     def _values_in_time(self, current_portfolio_value, **kwargs):
-        self.portfolio_value.value = current_portfolio_value
+        self.max_trades.value = np.ones(self.max_trades.shape) * \
+            self.volumes.current_value * \
+            self.max_participation_rate.current_value / current_portfolio_value
 
     def _compile_to_cvxpy(self, w_plus, z, w_plus_minus_w_bm):
         """Return a Cvxpy constraint."""
-        return cp.multiply(cp.abs(z[:-1]),
-                           self.portfolio_value) <= cp.multiply(self.volumes.parameter,
-                                                                self.max_participation_rate.parameter)
+        return cp.abs(z[:-1]) <= self.max_trades
 
 
 class LongOnly(BaseWeightConstraint):
@@ -23,8 +23,6 @@ as well as possible.
 import cvxpy as cp
 import numpy as np
 import pandas as pd
-import copy
-import inspect
 
 from .estimator import CvxpyExpressionEstimator,  DataEstimator
 from .utils import periods_per_year
@@ -124,11 +122,13 @@ class CombinedCosts(BaseCost):
 
     def _recursive_pre_evaluation(self, *args, **kwargs):
         """Iterate over constituent costs."""
-        [el._recursive_pre_evaluation(*args, **kwargs) for el in self.costs]
+        for el in self.costs:
+            el._recursive_pre_evaluation(*args, **kwargs)
 
     def _recursive_values_in_time(self, **kwargs):
         """Iterate over constituent costs."""
-        [el._recursive_values_in_time(**kwargs) for el in self.costs]
+        for el in self.costs:
+            el._recursive_values_in_time(**kwargs)
 
     def _compile_to_cvxpy(self, w_plus, z, portfolio_value):
         """Iterate over constituent costs."""
@@ -217,22 +217,28 @@ class HoldingCost(BaseCost):
 
         cash_return = current_and_past_returns.iloc[-1, -1]
         multiplier = 1 / (100 * ppy)
+        # non-cash positions as ndarray, avoids pandas overhead below
+        h = h_plus.values[:-1]
         result = 0.
-        borrowed_stock_positions = np.minimum(h_plus.iloc[:-1], 0.)
-        result += np.sum(((cash_return if self.cash_return_on_borrow else 0.) +
-                          (self.spread_on_borrowing_assets_percent._recursive_values_in_time(t) * multiplier if
-                           self.spread_on_borrowing_assets_percent is not None else 0.))
-                         * borrowed_stock_positions)
+        borrowed_stock_positions = np.minimum(h, 0.)
+        borrow_rate = (cash_return if self.cash_return_on_borrow else 0.) + \
+            (self.spread_on_borrowing_assets_percent._recursive_values_in_time(t) * multiplier if
+             self.spread_on_borrowing_assets_percent is not None else 0.)
+        # rates can be scalars or per-asset arrays, in the latter case we
+        # reduce with a dot product instead of an elementwise product and sum
+        result += borrow_rate * np.sum(borrowed_stock_positions) if np.isscalar(borrow_rate) \
+            else borrowed_stock_positions @ borrow_rate
 
         if self.dividends is not None:
-            result += np.sum(h_plus[:-1] *
-                             self.dividends._recursive_values_in_time(t))
+            dividends = self.dividends._recursive_values_in_time(t)
+            result += dividends * np.sum(h) if np.isscalar(dividends) \
+                else h @ dividends
 
         # lending_spread = DataEstimator(spread_on_lending_cash_percent)._recursive_values_in_time(t) * multiplier
         # borrowing_spread = DataEstimator(spread_on_borrowing_cash_percent)._recursive_values_in_time(t) * multiplier
 
         # cash_return = current_and_past_returns.iloc[-1,-1]
-        real_cash = h_plus.iloc[-1] + sum(np.minimum(h_plus.iloc[:-1], 0.))
+        real_cash = h_plus.values[-1] + np.sum(borrowed_stock_positions)
 
         if real_cash > 0:
             if self.spread_on_lending_cash_percent is not None:
@@ -250,16 +256,21 @@ class HoldingCost(BaseCost):
     def _compile_to_cvxpy(self, w_plus, z, w_plus_minus_w_bm):
         """Compile cost to cvxpy expression."""
 
-        expression = 0.
+        expression = cp.Constant(0.)
 
+        # inner products instead of sum(multiply(...)), smaller expression tree
         if not (self.spread_on_borrowing_assets_percent is None):
-            expression += cp.multiply(self.borrow_cost_stocks,
-                                      cp.neg(w_plus)[:-1])
+            expression += self.borrow_cost_stocks @ cp.neg(w_plus[:-1])
 
         if not (self.dividends is None):
-            expression -= cp.multiply(self.dividends.parameter, w_plus[:-1])
-        assert cp.sum(expression).is_convex()
-        return cp.sum(expression)
+            # dividends can be a scalar parameter (the default)
+            expression -= self.dividends.parameter @ w_plus[:-1] \
+                if self.dividends.parameter.ndim else \
+                self.dividends.parameter * cp.sum(w_plus[:-1])
+
+        assert expression.is_convex()
+        assert expression.is_dcp(dpp=True)
+        return expression
 
 
 class StocksHoldingCost(HoldingCost):
@@ -322,6 +333,10 @@ class TransactionCost(BaseCost):
         self.window_sigma_est = window_sigma_est
         self.window_volume_est = window_volume_est
         self.exponent = exponent
+        # defaults differ between optimization and simulation, see
+        # StocksTransactionCost; we resolve them once here
+        self._policy_exponent = 2. if exponent is None else float(exponent)
+        self._simulator_exponent = 1.5 if exponent is None else float(exponent)
 
     def _pre_evaluation(self, universe, backtest_times):
         if self.a is not None or self.pershare_cost is not None:
@@ -349,7 +364,13 @@ class TransactionCost(BaseCost):
         if self.a is not None or self.pershare_cost is not None:
             self.first_term_multiplier.value = tmp
 
-        if self.b is not None:
+        if self.b is not None and np.all(self.b.current_value == 0.):
+            # no market impact at this time, skip the estimates; the
+            # parameter stays in the expression so that it is not recompiled
+            self.second_term_multiplier.value = np.zeros(
+                past_returns.shape[1]-1)
+
+        elif self.b is not None:
 
             if (self.window_sigma_est is None) or \
                     (self.window_volume_est is None):
@@ -360,26 +381,23 @@ class TransactionCost(BaseCost):
                 self.window_volume_est is None) else self.window_volume_est
 
             # TODO refactor this with forecast.py logic
-            sigma_est = np.sqrt(
-                (past_returns.iloc[-windowsigma:, :-1]**2).mean()).values
-            volume_est = past_volumes.iloc[-windowvolume:].mean().values
+            # nan-aware reductions on ndarray views match the pandas ones
+            sigma_est = np.sqrt(np.nanmean(
+                past_returns.values[-windowsigma:, :-1]**2, axis=0))
+            volume_est = np.nanmean(
+                past_volumes.values[-windowvolume:], axis=0)
 
             self.second_term_multiplier.value = self.b.current_value * sigma_est * \
                 (current_portfolio_value /
-                 volume_est) ** ((2 if self.exponent is None else self.exponent) - 1)
+                 volume_est) ** (self._policy_exponent - 1)
 
     def _simulate(self, t, u, current_and_past_returns,
                   current_and_past_volumes, current_prices, **kwargs):
 
-        if self.window_sigma_est is None:
-            windowsigma = periods_per_year(current_and_past_returns.index)
-        else:
-            windowsigma = self.window_sigma_est
+        exponent = self._simulator_exponent
 
-        exponent = (1.5 if self.exponent is None else self.exponent)
-
-        sigma = np.std(
-            current_and_past_returns.iloc[-windowsigma:, :-1], axis=0)
+        # absolute value of the non-cash trades, computed once as ndarray
+        abs_u = np.abs(u.values[:-1])
 
         result = 0.
         if self.pershare_cost is not None:
@@ -387,20 +405,31 @@ class TransactionCost(BaseCost):
                 raise SyntaxError(
                     "If you don't provide prices you should set pershare_cost to None")
             result += self.pershare_cost._recursive_values_in_time(t) * int(
-                sum(np.abs(u.iloc[:-1] + 1E-6) / current_prices.values))
+                np.sum(np.abs(u.values[:-1] + 1E-6) / current_prices.values))
 
         if self.a is not None:
-            result += sum(self.a._recursive_values_in_time(t)
-                          * np.abs(u.iloc[:-1]))
+            result += np.sum(self.a._recursive_values_in_time(t) * abs_u)
 
         if self.b is not None:
             if current_and_past_volumes is None:
                 raise SyntaxError(
                     "If you don't provide volumes you should set b to None")
-            # we add 1 to the volumes to prevent 0 volumes error (trades are cancelled on 0 volumes)
-            result += (np.abs(u.iloc[:-1])**exponent) @ (
-                self.b._recursive_values_in_time(t) *
-                sigma / ((current_and_past_volumes.iloc[-1] + 1) ** (exponent - 1)))
+            b = self.b._recursive_values_in_time(t)
+            # the volatility estimate is only needed if there is market impact
+            if not np.all(b == 0.):
+                if self.window_sigma_est is None:
+                    windowsigma = periods_per_year(
+                        current_and_past_returns.index)
+                else:
+                    windowsigma = self.window_sigma_est
+                sigma = np.nanstd(
+                    current_and_past_returns.values[-windowsigma:, :-1], axis=0)
+                # we add 1 to the volumes to prevent 0 volumes error (trades are cancelled on 0 volumes)
+                # numpy already uses fast paths for the exponents 2 and .5
+                # (the latter for the volumes), not for the default 1.5
+                result += (abs_u * np.sqrt(abs_u) if exponent == 1.5
+                           else abs_u ** exponent) @ (
+                    b * sigma / ((current_and_past_volumes.values[-1] + 1) ** (exponent - 1)))
 
         assert not np.isnan(result)
         assert not np.isinf(result)
@@ -408,16 +437,27 @@ class TransactionCost(BaseCost):
         return -result
 
     def _compile_to_cvxpy(self, w_plus, z, w_plus_minus_w_bm):
+        """Compile cost to cvxpy expression.
+
+        All time-varying data enters through the two multiplier parameters,
+        which are updated in ``_values_in_time``, so the expression is
+        built once per backtest and stays DPP-compliant (cvxpy can then
+        reuse its canonicalization at each solve).
+        """
+
+        # shared by both terms, so it is a single atom in the expression tree
+        abs_z = cp.abs(z[:-1])
 
         expression = 0
         if self.a is not None or self.pershare_cost is not None:
-            expression += cp.abs(z[:-1]).T @ self.first_term_multiplier
+            expression += abs_z.T @ self.first_term_multiplier
             assert expression.is_convex()
         if self.b is not None:
-            expression += (cp.abs(z[:-1]) ** (
-                2 if self.exponent is None else self.exponent)
-            ).T @ self.second_term_multiplier
+            expression += (abs_z ** self._policy_exponent
+                           ).T @ self.second_term_multiplier
             assert expression.is_convex()
+        if not np.isscalar(expression):
+            assert expression.is_dcp(dpp=True)
         return expression
 
 
@@ -209,8 +209,11 @@ class DataEstimator(PolicyEstimator):
                         self.data.columns[np.isnan(result)])
                 raise MissingValuesError(message)
             else:
-                # we pass a copy because it can be accidentally overwritten
-                return np.array(result)
+                # we pass a read-only view because it can be accidentally
+                # overwritten; this is cheaper than copying the data
+                result = result.view()
+                result.flags.writeable = False
+                return result
 
         raise DataError(
             f"{self.__class__.__name__}._recursive_values_in_time result is not a scalar or array."
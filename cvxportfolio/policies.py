@@ -173,9 +173,10 @@ class FixedTrades(BaseTradingPolicy):
         """We need to override recursion b/c we catch exception."""
         try:
             super()._recursive_values_in_time(t=t, current_weights=current_weights, **kwargs)
+            # estimator values are read-only, the simulator modifies this
             return pd.Series(
                 self.trades_weights.current_value,
-                current_weights.index)
+                current_weights.index, copy=True)
         except MissingValuesError:
             return pd.Series(0., current_weights.index)
 
@@ -370,7 +371,7 @@ class MultiPeriodOptimization(BaseTradingPolicy):
                 self.w_plus_at_lags[i], self.z_at_lags[i], self.w_plus_minus_w_bm_at_lags[i])
             for i, el in enumerate(self.objective)]
         self.cvxpy_objective = sum(self.cvxpy_objective)
-        assert self.cvxpy_objective.is_dcp()  # dpp=True)
+        assert self.cvxpy_objective.is_dcp()
         assert self.cvxpy_objective.is_concave()
         self.cvxpy_constraints = [
             flatten_heterogeneous_list([constr._compile_to_cvxpy(self.w_plus_at_lags[i], self.z_at_lags[i], self.w_plus_minus_w_bm_at_lags[i])
@@ -389,7 +390,30 @@ class MultiPeriodOptimization(BaseTradingPolicy):
             self.cvxpy_constraints.append(w == self.terminal_constraint)
         self.problem = cp.Problem(cp.Maximize(
             self.cvxpy_objective), self.cvxpy_constraints)
-        assert self.problem.is_dcp()  # dpp=True)
+        assert self.problem.is_dcp()
+        if not self.problem.is_dcp(dpp=True):
+            warnings.warn(
+                f"The optimization problem of policy {self.__class__.__name__}"
+                " is not DPP because of " + ", ".join(self._non_dpp_terms())
+                + "; cvxpy will re-compile it at each solve, which is slower.")
+
+    def _non_dpp_terms(self):
+        """Names of the objective terms and constraints that are not DPP.
+
+        This compiles the terms again, so it is only used to report errors.
+        """
+        variables = (self.w_plus_at_lags[0], self.z_at_lags[0],
+                     self.w_plus_minus_w_bm_at_lags[0])
+        objective = self.objective[0]
+        terms = objective.costs if hasattr(objective, 'costs') else [objective]
+        result = []
+        for term in terms + list(self.constraints[0]):
+            compiled = term._compile_to_cvxpy(*variables)
+            compiled = compiled if isinstance(compiled, list) else [compiled]
+            if not all(cp.Constant(el).is_dcp(dpp=True) if np.isscalar(el)
+                       else el.is_dcp(dpp=True) for el in compiled):
+                result.append(term.__class__.__name__)
+        return result
 
     def _recursive_pre_evaluation(self, universe, backtest_times):
         """No point in using recursive super() method."""
@@ -28,7 +28,7 @@ from collections import defaultdict, OrderedDict
 from itertools import starmap
 import os
 
-from multiprocess import Pool, Lock
+from multiprocess import Pool, Lock, cpu_count
 import numpy as np
 import pandas as pd
 
@@ -43,9 +43,21 @@ PPY = 252
 __all__ = ['StockMarketSimulator', 'MarketSimulator']
 
 
-def _mp_init(l):
-    global LOCK
+def _mp_init(l, simulator):
+    """Initialize worker process with the cache lock and the simulator.
+
+    The simulator (with its market data) is passed once per worker
+    instead of once per task; on platforms that fork it is inherited
+    without being pickled at all.
+    """
+    global LOCK, SIMULATOR
     LOCK = l
+    SIMULATOR = simulator
+
+
+def _mp_worker(policy, start_time, end_time, h):
+    """Run a backtest in a worker process, see :func:`_mp_init`."""
+    return SIMULATOR._concatenated_backtests(policy, start_time, end_time, h)
 
 
 def _hash_universe(universe):
@@ -736,14 +748,16 @@ class MarketSimulator:
 
         n = len(policies)
 
-        zip_args = zip(policies, [self] * n,
-                       [start_time] * n, [end_time] * n, h)
-
         if (not parallel) or len(policies) == 1:
+            zip_args = zip(policies, [self] * n,
+                           [start_time] * n, [end_time] * n, h)
             result = list(starmap(self._worker, zip_args))
         else:
-            with Pool(initializer=_mp_init, initargs=(Lock(),)) as p:
-                result = p.starmap(self._worker, zip_args)
+            zip_args = zip(policies, [start_time] * n, [end_time] * n, h)
+            # the simulator is sent to each worker, so don't start more than needed
+            with Pool(processes=min(n, cpu_count()), initializer=_mp_init,
+                      initargs=(Lock(), self)) as p:
+                result = p.starmap(_mp_worker, zip_args)
 
         return [el for el in result]
 
@@ -284,7 +284,7 @@ class TestConstraints(unittest.TestCase):
         cons = model._compile_to_cvxpy(
             self.w_plus, self.z, self.w_plus_minus_w_bm)
         model._recursive_values_in_time(t=t, current_portfolio_value=value)
-        print(model.portfolio_value.value)
+        print(model.max_trades.value)
         # cons = model.weight_expr(t, None, z, value)[0]
         tmp = np.zeros(self.N)
         tmp[:-1] = self.volumes.loc[t].values / value * 0.05
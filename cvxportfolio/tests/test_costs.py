@@ -146,6 +146,8 @@ class TestCosts(unittest.TestCase):
             universe=self.returns.columns, backtest_times=self.returns.index)
         expression = tcost._compile_to_cvxpy(
             self.w_plus, self.z, self.w_plus_minus_w_bm)
+        # parameters are only updated in time, the expression is not rebuilt
+        self.assertTrue(expression.is_dcp(dpp=True))
 
         # only spread
 
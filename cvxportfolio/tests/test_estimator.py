@@ -71,6 +71,10 @@ class TestEstimators(unittest.TestCase):
         self.assertTrue(
             np.all(estimator._recursive_values_in_time(t=time) == data))
 
+        # the value served is a read-only view of the data
+        with self.assertRaises(ValueError):
+            estimator._recursive_values_in_time(t=time)[0] = 1.
+
         data[1] = np.nan
         estimator = DataEstimator(data)
         with self.assertRaises(MissingValuesError):
@@ -384,6 +384,44 @@ class TestPolicies(unittest.TestCase):
 
         self.assertTrue(np.allclose(result2, 0., atol=1e-7))
 
+    def test_single_period_optimization_not_dpp(self):
+        """A DCP but not DPP constraint only causes a warning."""
+
+        from cvxportfolio.constraints import BaseTradeConstraint
+        from cvxportfolio.estimator import DataEstimator
+
+        class ProductOfParameters(BaseTradeConstraint):
+
+            def __init__(self):
+                self.first = DataEstimator(1., compile_parameter=True)
+                self.second = DataEstimator(.5, compile_parameter=True)
+
+            def _compile_to_cvxpy(self, w_plus, z, w_plus_minus_w_bm):
+                return cp.norm1(z[:-1]) <= self.first.parameter * self.second.parameter
+
+        policy = SinglePeriodOptimization(
+            ReturnsForecast() - 2 * FullCovariance(),
+            constraints=[LongOnly(), LeverageLimit(1), ProductOfParameters()],
+            solver='ECOS')
+
+        policy._recursive_pre_evaluation(
+            universe=self.returns.columns, backtest_times=self.returns.index)
+        with self.assertWarnsRegex(UserWarning, 'ProductOfParameters'):
+            policy._compile_to_cvxpy()
+
+        curw = np.zeros(self.N)
+        curw[-1] = 1.
+
+        result = policy._recursive_values_in_time(
+            t=self.returns.index[134],
+            current_weights=pd.Series(curw, self.returns.columns),
+            current_portfolio_value=1000,
+            past_returns=self.returns.iloc[:134],
+            past_volumes=self.volumes.iloc[:134],
+            current_prices=pd.Series(1., self.volumes.columns))
+
+        self.assertTrue(np.sum(np.abs(result[:-1])) <= .5 + 1e-6)
+
     def test_single_period_optimization_infeasible(self):
 
         return_forecast = ReturnsForecast()
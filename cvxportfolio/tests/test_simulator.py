@@ -27,7 +27,7 @@ import pandas as pd
 from cvxportfolio.simulator import StockMarketSimulator, MarketSimulator, MarketData
 from cvxportfolio.estimator import DataEstimator
 
-from copy import deepcopy
+from copy import copy, deepcopy
 import cvxportfolio as cvx
 
 
@@ -48,6 +48,19 @@ class TestSimulator(unittest.TestCase):
         cls.market_data = MarketData(returns=cls.returns, volumes=cls.volumes, prices=cls.prices, cash_key='cash',
                                      base_location=cls.datadir)
         cls.universe = cls.returns.columns
+        cls._simulators = {}
+
+    @classmethod
+    def _simulator(cls, tickers, simulator_class=MarketSimulator):
+        """Simulator on a tuple of tickers, shared across tests.
+
+        Backtests restore the simulator's market data when they are done,
+        so it is safe to reuse it instead of re-reading the data.
+        """
+        if (simulator_class, tickers) not in cls._simulators:
+            cls._simulators[(simulator_class, tickers)] = simulator_class(
+                list(tickers), base_location=cls.datadir)
+        return cls._simulators[(simulator_class, tickers)]
 
     @classmethod
     def tearDownClass(cls):
@@ -70,7 +83,9 @@ class TestSimulator(unittest.TestCase):
 
         for i in range(len(freqs)):
 
-            new_md = deepcopy(md)
+            # _downsample reassigns the dataframes, so the original
+            # ones are untouched and there's no need to deep-copy them
+            new_md = copy(md)
 
             new_md._downsample(freqs[i])
             print(new_md.returns)
@@ -255,23 +270,23 @@ class TestSimulator(unittest.TestCase):
             spread_on_borrowing_stocks_percent=0.,
             cash_return_on_borrow=False)
 
-        for i in range(10):
-            np.random.seed(i)
-            h_plus = np.random.randn(self.returns.shape[1])*1000
-            h_plus = pd.Series(h_plus, self.returns.columns)
-            h_plus[-1] = 1000 - sum(h_plus[:-1])
+        # ten random post-trade portfolios, one per row
+        rng = np.random.default_rng(0)
+        h_plus = rng.standard_normal((10, self.returns.shape[1]))*1000
+        h_plus[:, -1] = 1000 - h_plus[:, :-1].sum(axis=1)
 
-            sim_cash_hcost = hcost._simulate(
-                t, h_plus=h_plus, current_and_past_returns=current_and_past_returns)
+        real_cash_position = h_plus[:, -1] + \
+            np.minimum(h_plus[:, :-1], 0.).sum(axis=1)
+        cash_hcost = np.where(real_cash_position > 0,
+                              real_cash_position *
+                              (np.maximum(cash_return - 0.005/252, 0.) - cash_return),
+                              real_cash_position * (0.005/252))
 
-            real_cash_position = h_plus[-1] + sum(np.minimum(h_plus[:-1], 0.))
-            if real_cash_position > 0:
-                cash_hcost = real_cash_position * \
-                    (np.maximum(cash_return - 0.005/252, 0.) - cash_return)
-            if real_cash_position < 0:
-                cash_hcost = real_cash_position * (0.005/252)
+        sim_cash_hcost = [hcost._simulate(
+            t, h_plus=pd.Series(el, self.returns.columns),
+            current_and_past_returns=current_and_past_returns) for el in h_plus]
 
-            self.assertTrue(np.isclose(cash_hcost, sim_cash_hcost))
+        self.assertTrue(np.allclose(cash_hcost, sim_cash_hcost))
 
     def test_stocks_holding_cost(self):
 
@@ -282,28 +297,26 @@ class TestSimulator(unittest.TestCase):
 
         cash_return = self.returns.loc[t, 'cash']
 
-        # stock holding cost
-        for i in range(10):
-            np.random.seed(i)
-            h_plus = np.random.randn(4)*10000
-            h_plus[3] = 10000 - sum(h_plus[:-1])
-            h_plus = pd.Series(h_plus)
-
-            dividends = np.random.uniform(size=len(h_plus)-1) * 1E-4
+        # stock holding cost, ten random portfolios and dividends, one per row
+        rng = np.random.default_rng(0)
+        h_plus = rng.standard_normal((10, 4))*10000
+        h_plus[:, 3] = 10000 - h_plus[:, :-1].sum(axis=1)
 
-            hcost = cvx.StocksHoldingCost(
-                spread_on_lending_cash_percent=0.,
-                spread_on_borrowing_cash_percent=0.,
-                dividends=dividends, periods_per_year=252)
+        dividends = rng.uniform(size=(10, 3)) * 1E-4
 
-            sim_hcost = hcost._simulate(
-                t=t, h_plus=h_plus, current_and_past_returns=current_and_past_returns)
+        total_borrow_cost = cash_return + (0.005)/252
+        hcost = total_borrow_cost * np.minimum(h_plus[:, :-1], 0.).sum(axis=1)
+        hcost += (dividends * h_plus[:, :-1]).sum(axis=1)
 
-            total_borrow_cost = cash_return + (0.005)/252
-            hcost = -total_borrow_cost * sum(-np.minimum(h_plus, 0.)[:-1])
-            hcost += dividends @ h_plus[:-1]
+        sim_hcost = [cvx.StocksHoldingCost(
+            spread_on_lending_cash_percent=0.,
+            spread_on_borrowing_cash_percent=0.,
+            dividends=divs, periods_per_year=252)._simulate(
+                t=t, h_plus=pd.Series(el),
+                current_and_past_returns=current_and_past_returns)
+            for el, divs in zip(h_plus, dividends)]
 
-            self.assertTrue(np.isclose(hcost, sim_hcost))
+        self.assertTrue(np.allclose(hcost, sim_hcost))
 
     def test_transaction_cost_syntax(self):
 
@@ -347,11 +360,17 @@ class TestSimulator(unittest.TestCase):
 
         n = len(current_prices)
 
+        # these don't depend on the trades, compute them once
+        cut = self.returns.index.searchsorted(t, side='right')
+        sigma = self.returns.values[max(cut-252, 0):cut, :-1].std(ddof=0, axis=0)
+        volumes = self.volumes.loc[t].to_numpy()
+        inverse_prices = 1. / current_prices.to_numpy()
+
         for i in range(10):
-            np.random.seed(i)
-            spreads = np.random.uniform(size=n)*1E-3
-            u = np.random.uniform(size=n+1)*1E4
-            u[-1] = -sum(u[:-1])
+            rng = np.random.default_rng(i)
+            spreads = rng.uniform(size=n)*1E-3
+            u = rng.uniform(size=n+1)*1E4
+            u[-1] = -u[:-1].sum()
             u = pd.Series(u, self.universe)
             u = MarketSimulator._round_trade_vector(u, current_prices)
 
@@ -361,21 +380,20 @@ class TestSimulator(unittest.TestCase):
                                        current_and_past_volumes=current_and_past_volumes,
                                        current_and_past_returns=current_and_past_returns)
 
-            shares = sum(np.abs(u[:-1] / current_prices))
+            u_np = u.to_numpy()
+            abs_u = np.abs(u_np[:-1])
+            shares = (abs_u * inverse_prices).sum()
             tcost = -0.005 * shares
             # print(tcost, sim_cost)
-            tcost -= np.abs(u.iloc[:-1]) @ spreads / 2
-            # print(self.returns.loc[self.returns.index <= t].iloc[-252:, :-1].std())
-            tcost -= sum((np.abs(u.iloc[:-1])**1.5) * self.returns.loc[self.returns.index <=
-                         t].iloc[-252:, :-1].std(ddof=0) / np.sqrt(self.volumes.loc[t]))
+            tcost -= abs_u @ spreads / 2
+            tcost -= (abs_u * np.sqrt(abs_u) * sigma / np.sqrt(volumes)).sum()
             # sim_tcost = simulator.transaction_costs(u)
             #
             print(tcost, sim_cost)
             self.assertTrue(np.isclose(tcost, sim_cost))
 
     def test_methods(self):
-        simulator = MarketSimulator(
-            ['ZM', 'META', 'AAPL'], base_location=self.datadir)
+        simulator = self._simulator(('ZM', 'META', 'AAPL'))
 
         # , pd.Timestamp('2022-04-11')]: # can't because sigma requires 1000 days
         for t in [pd.Timestamp('2023-04-13')]:
@@ -384,9 +402,9 @@ class TestSimulator(unittest.TestCase):
             # round trade
 
             for i in range(10):
-                np.random.seed(i)
-                tmp = np.random.uniform(size=4)*1000
-                tmp[3] = -sum(tmp[:3])
+                rng = np.random.default_rng(i)
+                tmp = rng.uniform(size=4)*1000
+                tmp[3] = -tmp[:3].sum()
                 u = pd.Series(tmp, simulator.market_data.universe)
                 rounded = simulator._round_trade_vector(
                     u, simulator.market_data.prices.loc[t])
@@ -396,60 +414,83 @@ class TestSimulator(unittest.TestCase):
 
                 print(u)
 
+    def test__simulate_policy_cash(self):
+        """Test cash accounting of the simulator for a few steps of Hold."""
+        simulator = self._simulator(('META', 'AAPL'), StockMarketSimulator)
+
+        times = simulator.market_data.returns.loc['2023-03-10':'2023-03-13'].index
+
+        policy = cvx.Hold()
+        policy._recursive_pre_evaluation(
+            universe=simulator.market_data.universe, backtest_times=times)
+
+        for i in range(10):
+            rng = np.random.default_rng(i)
+            h = rng.standard_normal(3)*10000
+            h[-1] = 10000 - h[:-1].sum()
+            h = pd.Series(h, simulator.market_data.universe)
+
+            for t in times:
+                oldcash = h[-1]
+                h, z, u, costs, timer = simulator._simulate(
+                    t=t, h=h, policy=policy)
+                tcost, hcost = costs['StocksTransactionCost'], costs['StocksHoldingCost']
+                self.assertTrue(tcost == 0.)
+                self.assertTrue(np.isclose(
+                    (oldcash + hcost) * (1+simulator.market_data.returns.loc[t, 'USDOLLAR']), h[-1]))
+
     def test__simulate_policy(self):
-        simulator = StockMarketSimulator(
-            ['META', 'AAPL'], base_location=self.datadir)
+        simulator = self._simulator(('META', 'AAPL'), StockMarketSimulator)
 
         start_time = '2023-03-10'
         end_time = '2023-04-20'
 
-        # hold
+        idx = simulator.market_data.returns.index
+        times = idx[idx.searchsorted(pd.Timestamp(start_time), side='left'):
+                    idx.searchsorted(pd.Timestamp(end_time), side='right')]
+        prices = simulator.market_data.prices
+
+        # holding, the stock positions follow the open prices
+        # of the period after each step
+        next_prices = prices.iloc[prices.index.get_indexer(times) + 1]
+        price_ratios = next_prices.to_numpy() / \
+            prices.loc[start_time].to_numpy()
+
+        # ten random initial portfolios, one per row
+        rng = np.random.default_rng(0)
+        h_all = rng.standard_normal((10, 3))*10000
+        h_all[:, -1] = 10000 - h_all[:, :-1].sum(axis=1)
+        backtest_times = simulator.market_data._get_backtest_times(
+            start_time, end_time, include_end=False)
+
         policy = cvx.Hold()
-        for i in range(10):
-            np.random.seed(i)
-            h = np.random.randn(3)*10000
-            h[-1] = 10000 - sum(h[:-1])
-            h0 = pd.Series(h, simulator.market_data.universe)
-            h = pd.Series(h0, copy=True)
+        for h0 in h_all:
+            h = pd.Series(h0, simulator.market_data.universe, copy=True)
 
             policy._recursive_pre_evaluation(
                 universe=simulator.market_data.universe,
-                backtest_times=simulator.market_data._get_backtest_times(
-                    start_time, end_time, include_end=False)
-            )
+                backtest_times=backtest_times)
 
-            for t in simulator.market_data.returns.index[(simulator.market_data.returns.index >= start_time) & (simulator.market_data.returns.index <= end_time)]:
-                oldcash = h[-1]
+            h_path = []
+            for t in times:
                 h, z, u, costs, timer = simulator._simulate(
                     t=t, h=h, policy=policy)
-                tcost, hcost = costs['StocksTransactionCost'], costs['StocksHoldingCost']
-                assert tcost == 0.
-                # if np.all(h0[:2] > 0):
-                #    assert hcost == 0.
-                assert np.isclose(
-                    (oldcash + hcost) * (1+simulator.market_data.returns.loc[t, 'USDOLLAR']), h[-1])
+                h_path.append(h.iloc[:-1].to_numpy())
 
-            simh = h0[:-1] * simulator.market_data.prices.loc[pd.Timestamp(
-                end_time) + pd.Timedelta('1d')] / simulator.market_data.prices.loc[start_time]
-            self.assertTrue(np.allclose(simh, h[:-1]))
+            expected_h_path = h0[:-1][None, :] * price_ratios
+            self.assertTrue(np.allclose(expected_h_path, np.array(h_path)))
 
         # proportional_trade
         policy = cvx.ProportionalTradeToTargets(
             targets=pd.DataFrame({pd.Timestamp(end_time) + pd.Timedelta('1d'):  pd.Series([0, 0, 1], simulator.market_data.returns.columns)}).T)
 
-        for i in range(10):
-            np.random.seed(i)
-            h = np.random.randn(3)*10000
-            h[-1] = 10000 - sum(h[:-1])
-            h0 = pd.Series(h, simulator.market_data.returns.columns)
-            h = pd.Series(h0, copy=True)
+        for h0 in h_all:
+            h = pd.Series(h0, simulator.market_data.returns.columns, copy=True)
             policy._recursive_pre_evaluation(
                 universe=simulator.market_data.universe,
-                backtest_times=simulator.market_data._get_backtest_times(
-                    start_time, end_time, include_end=False)
-            )
+                backtest_times=backtest_times)
 
-            for t in simulator.market_data.returns.index[(simulator.market_data.returns.index >= start_time) & (simulator.market_data.returns.index <= end_time)]:
+            for t in times:
                 oldcash = h[-1]
                 h, z, u, costs, timer = simulator._simulate(
                     t=t, h=h, policy=policy)
@@ -466,13 +507,44 @@ class TestSimulator(unittest.TestCase):
                                            .5 * cvx.FullCovariance(),
                                            [  # cvx.LongOnly(),
             cvx.LeverageLimit(1)], verbose=True)
-        sim = cvx.MarketSimulator(['AAPL', 'MSFT'],  # ', 'GE', 'CVX', 'XOM', 'AMZN', 'ORCL', 'WMT', 'HD', 'DIS', 'MCD', 'NKE']
-                                  base_location=self.datadir)
+        sim = self._simulator(('AAPL', 'MSFT'))
         result = sim.backtest(pol, pd.Timestamp(
             '2023-01-01'), pd.Timestamp('2023-04-20'))
 
         print(result)
 
+    def test_backtest_participation_rate_limit(self):
+        """Test backtests of optimization policies with ParticipationRateLimit.
+
+        The fixture data are too short for the default min_history, so we
+        use synthetic market data.
+        """
+        rng = np.random.default_rng(0)
+        index = pd.bdate_range('2020-01-01', periods=600)
+        columns = ['A', 'B', 'C']
+        returns = pd.DataFrame(
+            rng.standard_normal((600, 3))*0.01 + 0.0005, index, columns)
+        returns['cash'] = 0.0001
+        volumes = pd.DataFrame(rng.uniform(1E4, 1E5, (600, 3)), index, columns)
+        prices = pd.DataFrame(rng.uniform(10, 200, (600, 3)), index, columns)
+
+        sim = cvx.MarketSimulator(returns=returns, volumes=volumes, prices=prices,
+                                  cash_key='cash', base_location=self.datadir)
+
+        objective = cvx.ReturnsForecast() - cvx.FullCovariance()
+        constraints = [cvx.LeverageLimit(2),
+                       cvx.ParticipationRateLimit(volumes, 0.1)]
+
+        for pol in [cvx.SinglePeriodOptimization(objective, constraints),
+                    cvx.MultiPeriodOptimization(objective, constraints,
+                                                planning_horizon=2)]:
+            result = sim.backtest(pol, index[400], index[420])
+            participation = result.u.iloc[:, :-1].abs() / \
+                volumes.loc[result.u.index]
+            # the constraint is active, up to solver tolerance
+            self.assertTrue(np.all(participation <= 0.1 * 1.02))
+            self.assertTrue(np.any(participation > 0.1 * 0.98))
+
     def test_backtest_concatenation(self):
         sim = cvx.MarketSimulator(['AAPL', 'ZM'])
         pol = cvx.SinglePeriodOptimization(cvx.ReturnsForecast() -
@@ -501,8 +573,7 @@ class TestSimulator(unittest.TestCase):
 
         pol1 = cvx.Uniform()
 
-        sim = cvx.MarketSimulator(['AAPL', 'MSFT'],  # ', 'GE', 'CVX', 'XOM', 'AMZN', 'ORCL', 'WMT', 'HD', 'DIS', 'MCD', 'NKE']
-                                  base_location=self.datadir)
+        sim = self._simulator(('AAPL', 'MSFT'))
 
         with self.assertRaises(SyntaxError):
             result = sim.backtest_many([pol, pol1], pd.Timestamp(
@@ -520,7 +591,7 @@ class TestSimulator(unittest.TestCase):
         """Test re-use of a worker process"""
         cpus = multiprocessing.cpu_count()
 
-        sim = cvx.MarketSimulator(['AAPL', 'MSFT'], base_location=self.datadir)
+        sim = self._simulator(('AAPL', 'MSFT'))
         pols = [cvx.SinglePeriodOptimization(cvx.ReturnsForecast() - 1 * cvx.FullCovariance(), [cvx.LeverageLimit(1)])
                 for i in range(cpus*2)]
         results = sim.backtest_many(pols, pd.Timestamp(
@@ -531,7 +602,7 @@ class TestSimulator(unittest.TestCase):
     def test_multiple_backtest3(self):
         """Test benchmarks."""
 
-        sim = cvx.MarketSimulator(['AAPL', 'MSFT'], base_location=self.datadir)
+        sim = self._simulator(('AAPL', 'MSFT'))
         pols = [
             cvx.SinglePeriodOptimization(cvx.ReturnsForecast(
             ) - 1 * cvx.FullCovariance(), [cvx.LeverageLimit(1)]),
@@ -585,8 +656,7 @@ class TestSimulator(unittest.TestCase):
 
     def test_plot_result(self):
         """Test plot method of result."""
-        sim = cvx.MarketSimulator(
-            ['AAPL', 'MSFT', 'GE', 'ZM', 'META'], base_location=self.datadir)
+        sim = self._simulator(('AAPL', 'MSFT', 'GE', 'ZM', 'META'))
         sim.backtest(cvx.Uniform(), pd.Timestamp(
             '2023-01-01')).plot(show=False)
 